@@ -18,24 +18,112 @@ Date: October 2025
 """
 
 import pandas as pd
+import openpyxl
+import argparse
 import os
 import re
 import shutil
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import logging
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('file_processing.log'),
-        logging.StreamHandler()
-    ]
-)
+# Rust-backed reader (python-calamine); much faster and lighter than openpyxl for reading.
+# Falls back to streaming the workbook with openpyxl in read-only mode when not installed.
+try:
+    import python_calamine
+    EXCEL_ENGINE = "calamine"
+except ImportError:
+    EXCEL_ENGINE = "openpyxl"
+
+# Arrow-backed strings let .str methods run on contiguous UTF-8 buffers (optional)
+try:
+    import pyarrow
+    STRING_DTYPE = "string[pyarrow]"
+except ImportError:
+    STRING_DTYPE = "string"
+
+# xlsxwriter writes reports faster than openpyxl; openpyxl is the fallback
+try:
+    import xlsxwriter
+    REPORT_ENGINE = "xlsxwriter"
+except ImportError:
+    REPORT_ENGINE = "openpyxl"
+
+
+def read_excel_columns(path, usecols=None, names=None, dtype=STRING_DTYPE):
+    """Read selected columns (by index, or all when usecols is None) from the first sheet of an Excel workbook"""
+    if EXCEL_ENGINE == "calamine":
+        return pd.read_excel(path, engine="calamine", usecols=usecols, names=names, dtype=dtype)
+    
+    # read_only mode streams rows instead of building the whole workbook in memory
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, ())
+        data = []
+        last_non_empty = 0
+        for row in rows:
+            # Like pandas' own readers, whole-number floats come back as ints (1, not 1.0)
+            row = tuple(int(value) if isinstance(value, float) and value.is_integer() else value
+                        for value in row)
+            data.append(row if usecols is None else tuple(row[i] if i < len(row) else None for i in usecols))
+            if any(value is not None for value in row):
+                last_non_empty = len(data)
+    finally:
+        workbook.close()
+    
+    # Read-only sheets may report stale dimensions, padding the data with empty rows
+    del data[last_non_empty:]
+    
+    if usecols is None:
+        width = max([len(header)] + [len(row) for row in data])
+        usecols = range(width)
+        data = [row + (None,) * (width - len(row)) for row in data]
+    
+    if names is None:
+        names = [header[i] if i < len(header) and header[i] is not None else f"Unnamed: {i}"
+                 for i in usecols]
+    # Build as object first so mixed int/float columns aren't coerced before the string cast
+    return pd.DataFrame(data, columns=names, dtype=object).astype(dtype)
+
+
+# File copies are I/O bound and release the GIL, so threads overlap them well
+MAX_COPY_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# Larger chunks for shutil's read/write fallback loop (Windows already defaults to 1 MiB)
+shutil.COPY_BUFSIZE = max(shutil.COPY_BUFSIZE, 256 * 1024)
+
+
+def fast_copy(source, destination):
+    """Copy a file and its metadata, letting the kernel move the data where supported
+    
+    On Linux, os.copy_file_range copies in-kernel and can reflink on copy-on-write
+    filesystems. Everywhere else (or if it fails) shutil.copy2 is used, which already
+    picks sendfile/fcopyfile/CopyFile2 where available.
+    """
+    if hasattr(os, 'copy_file_range'):
+        # Opening the destination truncates it, which would wipe a hard-linked source
+        if os.path.exists(destination) and os.path.samefile(source, destination):
+            raise shutil.SameFileError(f"{source} and {destination} are the same file")
+        try:
+            with open(source, 'rb') as src, open(destination, 'wb') as dst:
+                remaining = os.fstat(src.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+            shutil.copystat(source, destination)
+            return
+        except OSError:
+            pass  # e.g. unsupported filesystem; shutil.copy2 overwrites any partial copy
+    
+    shutil.copy2(source, destination)
 
 class FileProcessor:
-    def __init__(self):
+    def __init__(self, force=False):
         # Define base paths
         self.base_path = Path(r"C:\Users\IS19\Documents\as_built_extraction")
         self.spreadsheet_path = self.base_path / "spreadsheet"
@@ -46,6 +134,14 @@ class FileProcessor:
         self.accommodation_file = self.spreadsheet_path / "accomodation_schedule.xlsx"
         self.architect_file = self.spreadsheet_path / "architect_spreadsheet.xlsx"
         
+        # Hard link files into the processed folder instead of copying them when both
+        # directories are on the same volume. Links share data with the architect files,
+        # so only enable this if the processed copies are never edited in place.
+        self.use_hardlinks = False
+        
+        # Re-copy files even when the processed copy is already up to date
+        self.force = force
+        
         # Statistics and detailed tracking
         self.stats = {
             'processed': 0,
@@ -56,7 +152,16 @@ class FileProcessor:
         
         # Detailed tracking for reporting
         self.detailed_results = {
-            'successful_matches': [],      # Files successfully processed
+            'successful_matches': {        # Files successfully processed (one list per field)
+                'flat_ref': [],
+                'title': [],
+                'original_filename': [],
+                'new_filename': [],
+                'source_path': [],
+                'destination_path': [],
+                'destination_folder': [],
+                'row_index': []
+            },
             'no_matches_found': [],        # Flat refs with no matching sections
             'file_not_found': [],          # Matches found but file missing
             'copy_errors': [],             # Files that failed to copy
@@ -64,16 +169,35 @@ class FileProcessor:
             'all_flat_refs': [],           # All flat references processed
             'all_section_files': []        # All section files in architect spreadsheet
         }
+        
+        # Guards stats and detailed_results while files are copied in parallel
+        self._lock = threading.Lock()
+        
+        # Output folders already created, by folder name
+        self._dir_cache = {}
+        
+        # Names in the architect directory (normcase'd), listed once before copying
+        self._architect_files = None
+        
+        # (row_index, destination_folder) of each successful copy, by flat reference
+        self._by_flat_ref = defaultdict(list)
     
     def load_spreadsheets(self):
         """Load both Excel spreadsheets into pandas DataFrames"""
         try:
-            logging.info("Loading accommodation schedule spreadsheet...")
-            self.accommodation_df = pd.read_excel(self.accommodation_file)
-            logging.info(f"Loaded {len(self.accommodation_df)} rows from accommodation schedule")
+            logging.info("Loading accommodation schedule and architect spreadsheets...")
+            # The two workbooks are independent, so parse them concurrently
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                # Only Column D (flat/house references) is used
+                accommodation_future = executor.submit(read_excel_columns, self.accommodation_file, usecols=[3])
+                # Only Column A (filename) and Column B (title) are used
+                architect_future = executor.submit(
+                    read_excel_columns, self.architect_file, usecols=[0, 1], names=['filename', 'title']
+                )
+                self.accommodation_df = accommodation_future.result()
+                self.architect_df = architect_future.result()
             
-            logging.info("Loading architect spreadsheet...")
-            self.architect_df = pd.read_excel(self.architect_file)
+            logging.info(f"Loaded {len(self.accommodation_df)} rows from accommodation schedule")
             logging.info(f"Loaded {len(self.architect_df)} rows from architect spreadsheet")
             
             # Display column info for debugging
@@ -89,17 +213,13 @@ class FileProcessor:
     def get_flat_references(self):
         """Extract flat/house references from Column D of accommodation schedule"""
         try:
-            # Assuming Column D contains the flat references
-            # Get the 4th column (index 3) which should be Column D
-            flat_refs_raw = self.accommodation_df.iloc[:, 3].dropna().unique()
-            
-            # Filter out header and non-data entries
-            flat_refs = []
-            for ref in flat_refs_raw:
-                ref_str = str(ref).strip()
-                # Skip header rows and empty strings
-                if ref_str and ref_str != "Flat / House Ref" and not ref_str.startswith("Flat"):
-                    flat_refs.append(ref_str)
+            # Column D is the only column loaded from the accommodation schedule (already
+            # STRING_DTYPE, so these run on Arrow strings when pyarrow is installed)
+            refs = self.accommodation_df.iloc[:, 0].dropna().str.strip()
+            
+            # Filter out header rows and empty strings
+            is_data = refs.ne("") & refs.ne("Flat / House Ref") & ~refs.str.startswith("Flat")
+            flat_refs = refs[is_data].unique().tolist()
             
             logging.info(f"Found {len(flat_refs)} unique flat references")
             logging.info(f"Sample references: {list(flat_refs[:5])}")
@@ -115,9 +235,9 @@ class FileProcessor:
         matches = []
         
         try:
-            # Get Column B (Title) - assuming it's the 2nd column (index 1)
-            titles = self.architect_df.iloc[:, 1]  # Column B
-            filenames = self.architect_df.iloc[:, 0]  # Column A
+            titles = self.architect_df['title']  # Column B
+            # Column A; missing cells come back as pd.NA, which can't be compared with ==
+            filenames = self.architect_df['filename'].to_numpy(dtype=object, na_value=None)
             
             # Store all flat refs for reporting
             self.detailed_results['all_flat_refs'] = list(flat_refs)
@@ -126,11 +246,30 @@ class FileProcessor:
             drawing_mask = titles.str.contains("Sections|Floor Plans", case=False, na=False, regex=True)
             for idx in drawing_mask[drawing_mask].index:
                 self.detailed_results['all_section_files'].append({
-                    'filename': filenames.iloc[idx],
+                    'filename': filenames[idx],
                     'title': titles.iloc[idx],
                     'matched': False  # Will be updated when matches are found
                 })
             
+            # Index drawing files by (filename, title) so matches can be marked in O(1);
+            # setdefault keeps the first entry when a row is duplicated
+            section_index = {}
+            for section_file in self.detailed_results['all_section_files']:
+                section_index.setdefault((section_file['filename'], section_file['title']), section_file)
+            
+            # Only Sections and Floor Plans titles can produce a match, so classify those rows
+            # once here and scan just them for each flat reference
+            drawing_rows = titles.str.contains(r'\bSections\b|\bFloor Plans?\b', case=False, na=False, regex=True)
+            drawing_titles = titles[drawing_rows]
+            
+            # Determine drawing type from title ("Floor Plan" matches both "Floor Plans" and "Floor Plan")
+            drawing_types = pd.Series("unknown", index=drawing_titles.index)
+            drawing_types[drawing_titles.str.contains("Floor Plan", regex=False)] = "floorplans"
+            drawing_types[drawing_titles.str.contains("Sections", regex=False)] = "sections"
+            
+            # Extract folder name from architect spreadsheet title
+            folder_names = {idx: self.extract_folder_name_from_title(title) for idx, title in drawing_titles.items()}
+            
             for flat_ref in flat_refs:
                 self.stats['processed'] += 1
                 
@@ -151,63 +290,43 @@ class FileProcessor:
                     if match:
                         house_type_base = match.group(1)
                 
-                # Build search patterns
-                section_pattern = f"Sections - {flat_ref}"
-                floorplan_pattern = f"Floor Plans - {flat_ref}"
-                
-                # For flat types, also search for abbreviated forms
-                section_matches = titles.str.contains(section_pattern, case=False, na=False)
-                floorplan_matches = titles.str.contains(floorplan_pattern, case=False, na=False)
+                # Build search patterns (references are matched literally, not as regex)
+                escaped_ref = re.escape(flat_ref)
+                patterns = [
+                    f"Sections - {escaped_ref}",
+                    f"Floor Plans - {escaped_ref}"
+                ]
                 
                 # Additional patterns for flat types using abbreviated notation
                 if flat_type_prefix:
                     # Match patterns like "Flat Type E", "Flat Types A & B", "FT A 1B2P & FT B 1B2P"
                     # Use word boundary to match the letter anywhere in the flat type designation
-                    flat_type_pattern = rf'\bFlat Type[s]?\s+[A-Z\s&]*\b{flat_type_prefix}\b'
-                    ft_abbrev_pattern = rf'\bFT\s+[A-Z0-9\s&]*\b{flat_type_prefix}\b'
-                    
-                    flat_type_matches = titles.str.contains(flat_type_pattern, case=False, na=False, regex=True)
-                    ft_abbrev_matches = titles.str.contains(ft_abbrev_pattern, case=False, na=False, regex=True)
-                    
-                    matching_rows = section_matches | floorplan_matches | flat_type_matches | ft_abbrev_matches
+                    escaped_prefix = re.escape(flat_type_prefix)
+                    patterns.append(rf'\bFlat Type[s]?\s+[A-Z\s&]*\b{escaped_prefix}\b')
+                    patterns.append(rf'\bFT\s+[A-Z0-9\s&]*\b{escaped_prefix}\b')
                 elif house_type_base:
                     # For house types, also match the base pattern without bed/person count
                     # e.g., "HT C3H5 3B5P" should also match "Floor Plans - HT C3H5"
-                    section_base_pattern = f"Sections - {house_type_base}"
-                    floorplan_base_pattern = f"Floor Plans - {house_type_base}"
-                    section_base_singular = f"Section - {house_type_base}"  # Some use singular "Section"
-                    floorplan_base_singular = f"Floor Plan - {house_type_base}"
-                    
-                    section_base_matches = titles.str.contains(section_base_pattern, case=False, na=False)
-                    floorplan_base_matches = titles.str.contains(floorplan_base_pattern, case=False, na=False)
-                    section_singular_matches = titles.str.contains(section_base_singular, case=False, na=False)
-                    floorplan_singular_matches = titles.str.contains(floorplan_base_singular, case=False, na=False)
-                    
-                    matching_rows = section_matches | floorplan_matches | section_base_matches | floorplan_base_matches | section_singular_matches | floorplan_singular_matches
-                else:
-                    matching_rows = section_matches | floorplan_matches
+                    escaped_base = re.escape(house_type_base)
+                    patterns.append(f"Sections - {escaped_base}")
+                    patterns.append(f"Floor Plans - {escaped_base}")
+                    patterns.append(f"Section - {escaped_base}")  # Some use singular "Section"
+                    patterns.append(f"Floor Plan - {escaped_base}")
+                
+                # One pass over the drawing titles for all of this reference's patterns.
+                # Passed as a string with case=False: pandas < 3 can't take a compiled
+                # pattern on Arrow-backed strings
+                combined_pattern = '|'.join(f'(?:{pattern})' for pattern in patterns)
+                matching_rows = drawing_titles.str.contains(combined_pattern, case=False, na=False)
                 
                 if matching_rows.any():
                     # Get all matches (there might be multiple)
                     for idx in matching_rows[matching_rows].index:
-                        filename = filenames.iloc[idx]
-                        title = titles.iloc[idx]
-                        
-                        # Only process Sections and Floor Plans - skip other drawing types
-                        if not (re.search(r'\bSections\b', title, re.IGNORECASE) or 
-                                re.search(r'\bFloor Plans?\b', title, re.IGNORECASE)):
-                            continue
+                        filename = filenames[idx]
+                        title = drawing_titles.at[idx]
+                        drawing_type = drawing_types.at[idx]
                         
-                        # Determine drawing type from title
-                        if "Sections" in title:
-                            drawing_type = "sections"
-                        elif "Floor Plan" in title:  # Matches both "Floor Plans" and "Floor Plan"
-                            drawing_type = "floorplans"
-                        else:
-                            drawing_type = "unknown"
-                        
-                        # Extract folder name from architect spreadsheet title
-                        folder_name = self.extract_folder_name_from_title(title)
+                        folder_name = folder_names[idx]
                         if not folder_name:
                             logging.warning(f"Could not extract folder name from title: {title}")
                             continue
@@ -224,12 +343,11 @@ class FileProcessor:
                         matches.append(match_info)
                         
                         # Mark this section file as matched
-                        for section_file in self.detailed_results['all_section_files']:
-                            if section_file['filename'] == filename and section_file['title'] == title:
-                                section_file['matched'] = True
-                                break
+                        section_file = section_index.get((filename, title))
+                        if section_file is not None:
+                            section_file['matched'] = True
                         
-                        logging.info(f"Match found: {flat_ref} -> {title} -> {filename}")
+                        logging.debug(f"Match found: {flat_ref} -> {title} -> {filename}")
                         self.stats['matched'] += 1
                 else:
                     logging.warning(f"No match found for: {flat_ref}")
@@ -312,41 +430,69 @@ class FileProcessor:
     
     def create_output_structure(self, folder_name):
         """Create the output folder structure based on architect spreadsheet grouping"""
+        output_path = self._dir_cache.get(folder_name)
+        if output_path is not None:
+            return output_path
+        
         try:
             output_path = self.processed_path / folder_name
             output_path.mkdir(parents=True, exist_ok=True)
+            self._dir_cache[folder_name] = output_path
             
-            logging.info(f"Created directory structure: {output_path}")
+            logging.debug(f"Created directory structure: {output_path}")
             return output_path
             
         except Exception as e:
             logging.error(f"Error creating directory structure: {str(e)}")
             return None
     
-    def generate_new_filename(self, original_filename, folder_name, drawing_type="sections"):
-        """Generate new filename in format drawingtype_foldername_originalname.pdf"""
+    def assign_new_filenames(self, matches):
+        """Set 'new_filename' on every match in one vectorized pass
+        
+        Format: drawingtype_foldername_originalname.pdf, with spaces removed from the
+        folder name ("HT B 2B3P & HT D 3B4P" -> "HTB2B3P&HTD3B4P")
+        """
+        filenames = pd.Series([match['filename'] for match in matches], dtype=STRING_DTYPE)
+        folder_names = pd.Series([match['folder_name'] for match in matches], dtype=STRING_DTYPE)
+        drawing_types = pd.Series([match.get('drawing_type', 'sections') for match in matches], dtype=STRING_DTYPE)
+        
+        # Source files are looked up with a .pdf extension, so every name has one
+        with_ext = filenames.where(filenames.str.lower().str.endswith('.pdf'), filenames + '.pdf')
+        # When every filename is missing, expand=True returns only column 0; restore
+        # column 1 (as missing strings) so those matches fall through to copy errors
+        name_parts = with_ext.str.rsplit('.', n=1, expand=True).reindex(columns=[0, 1]).astype(STRING_DTYPE)
+        
+        new_filenames = (drawing_types + '_' + folder_names.str.replace(' ', '', regex=False) + '_' +
+                         name_parts[0] + '.' + name_parts[1])
+        
+        # Missing filenames stay None; copy_file reports those as copy errors
+        for match, new_filename in zip(matches, new_filenames.to_numpy(dtype=object, na_value=None)):
+            match['new_filename'] = new_filename
+    
+    def is_up_to_date(self, source_file, dest_file):
+        """Check whether dest_file matches source_file by size and modification time"""
         try:
-            # Remove spaces and special chars from folder_name for filename
-            # "FT A & B" -> "FTA&B", "HT B 2B3P & HT D 3B4P" -> "HTB2B3P&HTD3B4P"
-            clean_folder = folder_name.replace(" ", "")
-            
-            # Get the original filename without extension for uniqueness
-            orig_name = original_filename
-            if "." in original_filename:
-                orig_name = original_filename.rsplit(".", 1)[0]  # Remove extension
-                file_ext = "." + original_filename.rsplit(".", 1)[1]
-            else:
-                file_ext = ".pdf"  # Default to PDF
-            
-            # Create new filename: drawingtype_foldername_originalname.ext
-            new_filename = f"{drawing_type}_{clean_folder}_{orig_name}{file_ext}"
-            
-            logging.info(f"Generated new filename: {original_filename} -> {new_filename}")
-            return new_filename
-            
-        except Exception as e:
-            logging.error(f"Error generating filename for {original_filename}: {str(e)}")
-            return original_filename
+            source_stat = source_file.stat()
+            dest_stat = dest_file.stat()
+        except FileNotFoundError:
+            return False
+        
+        # copy2/copystat preserve mtime; compare whole seconds to allow for filesystem precision
+        return (source_stat.st_size == dest_stat.st_size and
+                int(source_stat.st_mtime) == int(dest_stat.st_mtime))
+    
+    def link_file(self, source_file, dest_file):
+        """Hard link dest_file to source_file; returns False if the caller should copy instead"""
+        try:
+            if source_file.stat().st_dev != dest_file.parent.stat().st_dev:
+                return False
+            if os.path.exists(dest_file) and os.path.samefile(source_file, dest_file):
+                return True  # Already linked by an earlier run
+            os.link(source_file, dest_file)
+            return True
+        except OSError:
+            # e.g. destination already holds a copy, or the filesystem doesn't support links
+            return False
     
     def copy_file(self, source_filename, destination_path, match_info):
         """Copy file from architect directory to destination"""
@@ -360,58 +506,89 @@ class FileProcessor:
             
             source_file = self.architect_path / source_filename_with_ext
             
-            if not source_file.exists():
+            # Check against the directory listing first. A miss is confirmed with a stat:
+            # case-insensitive filesystems other than Windows (macOS, network shares)
+            # find names that differ only in case, and subfolder names aren't listed
+            source_exists = (self._architect_files is not None and
+                             os.path.basename(source_filename_with_ext) == source_filename_with_ext and
+                             os.path.normcase(source_filename_with_ext) in self._architect_files)
+            if not source_exists:
+                source_exists = os.path.exists(source_file)
+            
+            if not source_exists:
                 logging.error(f"Source file not found: {source_file}")
-                self.stats['copy_errors'] += 1
-                
-                # Track file not found
-                self.detailed_results['file_not_found'].append({
-                    'flat_ref': match_info['flat_ref'],
-                    'title': match_info['title'],
-                    'filename': source_filename,
-                    'expected_path': str(source_file),
-                    'reason': 'File not found in architect directory'
-                })
+                with self._lock:
+                    self.stats['copy_errors'] += 1
+                    
+                    # Track file not found
+                    self.detailed_results['file_not_found'].append({
+                        'flat_ref': match_info['flat_ref'],
+                        'title': match_info['title'],
+                        'filename': source_filename,
+                        'expected_path': str(source_file),
+                        'reason': 'File not found in architect directory',
+                        'row_index': match_info['row_index']
+                    })
                 return False
             
-            # Generate new filename with drawing type
-            drawing_type = match_info.get('drawing_type', 'sections')
-            new_filename = self.generate_new_filename(source_filename_with_ext, match_info['folder_name'], drawing_type)
+            # New filename with drawing type, precomputed by assign_new_filenames
+            new_filename = match_info['new_filename']
             
             # Create destination file path with new filename
             dest_file = destination_path / new_filename
             
-            # Copy the file
-            shutil.copy2(source_file, dest_file)
-            logging.info(f"Successfully copied: {source_filename_with_ext} -> {dest_file}")
+            # Copy the file (or hard link it, when enabled and possible), unless an
+            # earlier run already produced it
+            if not self.force and self.is_up_to_date(source_file, dest_file):
+                logging.debug(f"Already up to date: {dest_file}")
+            elif not (self.use_hardlinks and self.link_file(source_file, dest_file)):
+                fast_copy(source_file, dest_file)
+            logging.debug(f"Successfully copied: {source_filename_with_ext} -> {dest_file}")
             
             # Track successful copy
-            self.detailed_results['successful_matches'].append({
-                'flat_ref': match_info['flat_ref'],
-                'title': match_info['title'],
-                'original_filename': source_filename_with_ext,
-                'new_filename': new_filename,
-                'source_path': str(source_file),
-                'destination_path': str(dest_file),
-                'destination_folder': str(destination_path)
-            })
+            with self._lock:
+                successful = self.detailed_results['successful_matches']
+                successful['flat_ref'].append(match_info['flat_ref'])
+                successful['title'].append(match_info['title'])
+                successful['original_filename'].append(source_filename_with_ext)
+                successful['new_filename'].append(new_filename)
+                successful['source_path'].append(str(source_file))
+                successful['destination_path'].append(str(dest_file))
+                successful['destination_folder'].append(str(destination_path))
+                successful['row_index'].append(match_info['row_index'])
+                self._by_flat_ref[match_info['flat_ref']].append((match_info['row_index'], str(destination_path)))
             
             return True
             
         except Exception as e:
             logging.error(f"Error copying file {source_filename}: {str(e)}")
-            self.stats['copy_errors'] += 1
-            
-            # Track copy error
-            self.detailed_results['copy_errors'].append({
-                'flat_ref': match_info['flat_ref'],
-                'title': match_info['title'],
-                'filename': source_filename,
-                'source_path': str(source_file) if 'source_file' in locals() else 'Unknown',
-                'error': str(e)
-            })
+            with self._lock:
+                self.stats['copy_errors'] += 1
+                
+                # Track copy error
+                self.detailed_results['copy_errors'].append({
+                    'flat_ref': match_info['flat_ref'],
+                    'title': match_info['title'],
+                    'filename': source_filename,
+                    'source_path': str(source_file) if 'source_file' in locals() else 'Unknown',
+                    'error': str(e),
+                    'row_index': match_info['row_index']
+                })
             return False
     
+    def list_architect_files(self):
+        """List the architect directory once so copies don't need a stat per source file"""
+        try:
+            return {os.path.normcase(entry.name) for entry in os.scandir(self.architect_path)}
+        except OSError as e:
+            logging.warning(f"Could not list architect directory: {str(e)}")
+            return None
+    
+    def copy_matches(self, destination_path, matches):
+        """Copy a group of matches that share a destination, one after another"""
+        for match in matches:
+            self.copy_file(match['filename'], destination_path, match)
+    
     def process_files(self):
         """Main processing function"""
         logging.info("Starting file processing...")
@@ -433,18 +610,40 @@ class FileProcessor:
             logging.warning("No drawing matches found.")
             return True
         
-        # Process each match
+        self.assign_new_filenames(matches)
+        
+        # Create output directory structure and group matches by destination file; matches
+        # that write the same file must not run concurrently. Key on the new filename, as
+        # different spreadsheet names ("C001" / "C001.pdf", or case on Windows) can map to it
+        copy_groups = {}
         for match in matches:
-            folder_name = match['folder_name']
-            filename = match['filename']
-            
-            # Create output directory structure
-            output_dir = self.create_output_structure(folder_name)
+            output_dir = self.create_output_structure(match['folder_name'])
             if output_dir is None:
                 continue
-            
-            # Copy the file
-            self.copy_file(filename, output_dir, match)
+            dest_key = os.path.normcase(match['new_filename'] or '')
+            copy_groups.setdefault((output_dir, dest_key), []).append(match)
+        
+        self._architect_files = self.list_architect_files()
+        
+        # Copy the files in parallel, one worker per destination group
+        with ThreadPoolExecutor(max_workers=MAX_COPY_WORKERS) as executor:
+            futures = [
+                executor.submit(self.copy_matches, output_dir, group)
+                for (output_dir, _), group in copy_groups.items()
+            ]
+            for future in futures:
+                future.result()
+        
+        # Workers finish in any order; restore the order the matches were found in
+        ref_order = {flat_ref: position for position, flat_ref in enumerate(flat_refs)}
+        for key in ('file_not_found', 'copy_errors'):
+            self.detailed_results[key].sort(key=lambda item: (ref_order[item['flat_ref']], item['row_index']))
+        
+        successful = self.detailed_results['successful_matches']
+        order = sorted(range(len(successful['flat_ref'])),
+                       key=lambda i: (ref_order[successful['flat_ref'][i]], successful['row_index'][i]))
+        for values in successful.values():
+            values[:] = [values[i] for i in order]
         
         # Print statistics
         self.print_statistics()
@@ -474,8 +673,13 @@ class FileProcessor:
         report_filename = f"processing_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
         report_path = self.base_path / report_filename
         
+        successful = self.detailed_results['successful_matches']
+        successful_count = len(successful['flat_ref'])
+        
         try:
-            with pd.ExcelWriter(report_path, engine='openpyxl') as writer:
+            # Note: xlsxwriter's constant_memory mode can't be used here, as pandas writes
+            # each sheet column by column and that mode silently drops out-of-order cells
+            with pd.ExcelWriter(report_path, engine=REPORT_ENGINE) as writer:
                 
                 # 1. Summary Statistics Sheet
                 summary_data = {
@@ -492,105 +696,72 @@ class FileProcessor:
                     'Value': [
                         len(self.detailed_results['all_flat_refs']),
                         len(self.detailed_results['all_section_files']),
-                        len(self.detailed_results['successful_matches']),
+                        successful_count,
                         len(self.detailed_results['no_matches_found']),
                         len(self.detailed_results['file_not_found']),
                         len(self.detailed_results['copy_errors']),
                         len(self.detailed_results['unused_section_files']),
-                        round((len(self.detailed_results['successful_matches']) / max(1, len(self.detailed_results['all_flat_refs']))) * 100, 1)
+                        round((successful_count / max(1, len(self.detailed_results['all_flat_refs']))) * 100, 1)
                     ]
                 }
                 summary_df = pd.DataFrame(summary_data)
                 summary_df.to_excel(writer, sheet_name='Summary', index=False)
                 
                 # 2. Successfully Processed Files Sheet
-                if self.detailed_results['successful_matches']:
-                    processed_data = []
-                    for item in self.detailed_results['successful_matches']:
-                        processed_data.append({
-                            'Flat Reference': item['flat_ref'],
-                            'Original Filename': item['original_filename'],
-                            'New Filename': item['new_filename'],
-                            'Title': item['title'],
-                            'Source Path': item['source_path'],
-                            'Destination Path': item['destination_path'],
-                            'Destination Folder': item['destination_folder']
-                        })
-                    processed_df = pd.DataFrame(processed_data)
-                    processed_df.to_excel(writer, sheet_name='Successfully Processed', index=False)
-                else:
-                    # Create empty sheet with headers
-                    empty_df = pd.DataFrame(columns=['Flat Reference', 'Original Filename', 'New Filename', 'Title', 'Source Path', 'Destination Path', 'Destination Folder'])
-                    empty_df.to_excel(writer, sheet_name='Successfully Processed', index=False)
+                # Tracked results go straight into the DataFrame; columns= picks and orders the fields
+                # (and still writes the headers when there are no records)
+                processed_columns = {
+                    'flat_ref': 'Flat Reference',
+                    'original_filename': 'Original Filename',
+                    'new_filename': 'New Filename',
+                    'title': 'Title',
+                    'source_path': 'Source Path',
+                    'destination_path': 'Destination Path',
+                    'destination_folder': 'Destination Folder'
+                }
+                processed_df = pd.DataFrame(successful, columns=list(processed_columns))
+                processed_df.rename(columns=processed_columns).to_excel(writer, sheet_name='Successfully Processed', index=False)
                 
                 # 3. No Matches Found Sheet
-                if self.detailed_results['no_matches_found']:
-                    no_match_data = []
-                    for item in self.detailed_results['no_matches_found']:
-                        no_match_data.append({
-                            'Flat Reference': item['flat_ref'],
-                            'Reason': item['reason']
-                        })
-                    no_match_df = pd.DataFrame(no_match_data)
-                    no_match_df.to_excel(writer, sheet_name='No Matches Found', index=False)
-                else:
-                    empty_df = pd.DataFrame(columns=['Flat Reference', 'Reason'])
-                    empty_df.to_excel(writer, sheet_name='No Matches Found', index=False)
+                no_match_columns = {
+                    'flat_ref': 'Flat Reference',
+                    'reason': 'Reason'
+                }
+                no_match_df = pd.DataFrame(self.detailed_results['no_matches_found'], columns=list(no_match_columns))
+                no_match_df.rename(columns=no_match_columns).to_excel(writer, sheet_name='No Matches Found', index=False)
                 
                 # 4. Files Not Found Sheet
-                if self.detailed_results['file_not_found']:
-                    not_found_data = []
-                    for item in self.detailed_results['file_not_found']:
-                        not_found_data.append({
-                            'Flat Reference': item['flat_ref'],
-                            'Title': item['title'],
-                            'Filename': item['filename'],
-                            'Expected Path': item['expected_path'],
-                            'Reason': item['reason']
-                        })
-                    not_found_df = pd.DataFrame(not_found_data)
-                    not_found_df.to_excel(writer, sheet_name='Files Not Found', index=False)
-                else:
-                    empty_df = pd.DataFrame(columns=['Flat Reference', 'Title', 'Filename', 'Expected Path', 'Reason'])
-                    empty_df.to_excel(writer, sheet_name='Files Not Found', index=False)
+                not_found_columns = {
+                    'flat_ref': 'Flat Reference',
+                    'title': 'Title',
+                    'filename': 'Filename',
+                    'expected_path': 'Expected Path',
+                    'reason': 'Reason'
+                }
+                not_found_df = pd.DataFrame(self.detailed_results['file_not_found'], columns=list(not_found_columns))
+                not_found_df.rename(columns=not_found_columns).to_excel(writer, sheet_name='Files Not Found', index=False)
                 
                 # 5. Copy Errors Sheet
-                if self.detailed_results['copy_errors']:
-                    error_data = []
-                    for item in self.detailed_results['copy_errors']:
-                        error_data.append({
-                            'Flat Reference': item['flat_ref'],
-                            'Title': item['title'],
-                            'Filename': item['filename'],
-                            'Source Path': item['source_path'],
-                            'Error': item['error']
-                        })
-                    error_df = pd.DataFrame(error_data)
-                    error_df.to_excel(writer, sheet_name='Copy Errors', index=False)
-                else:
-                    empty_df = pd.DataFrame(columns=['Flat Reference', 'Title', 'Filename', 'Source Path', 'Error'])
-                    empty_df.to_excel(writer, sheet_name='Copy Errors', index=False)
+                error_columns = {
+                    'flat_ref': 'Flat Reference',
+                    'title': 'Title',
+                    'filename': 'Filename',
+                    'source_path': 'Source Path',
+                    'error': 'Error'
+                }
+                error_df = pd.DataFrame(self.detailed_results['copy_errors'], columns=list(error_columns))
+                error_df.rename(columns=error_columns).to_excel(writer, sheet_name='Copy Errors', index=False)
                 
                 # 6. Unused Section Files Sheet
-                if self.detailed_results['unused_section_files']:
-                    unused_data = []
-                    for item in self.detailed_results['unused_section_files']:
-                        unused_data.append({
-                            'Filename': item['filename'],
-                            'Title': item['title'],
-                            'Status': 'UNUSED'
-                        })
-                    unused_df = pd.DataFrame(unused_data)
-                    unused_df.to_excel(writer, sheet_name='Unused Section Files', index=False)
-                else:
-                    empty_df = pd.DataFrame(columns=['Filename', 'Title', 'Status'])
-                    empty_df.to_excel(writer, sheet_name='Unused Section Files', index=False)
+                unused_df = pd.DataFrame(self.detailed_results['unused_section_files'], columns=['filename', 'title'])
+                unused_df = unused_df.rename(columns={'filename': 'Filename', 'title': 'Title'}).assign(Status='UNUSED')
+                unused_df.to_excel(writer, sheet_name='Unused Section Files', index=False)
                 
                 # 7. All Flat References Sheet
                 flat_ref_data = []
                 for i, flat_ref in enumerate(self.detailed_results['all_flat_refs'], 1):
-                    processed = any(item['flat_ref'] == flat_ref for item in self.detailed_results['successful_matches'])
-                    files_count = sum(1 for item in self.detailed_results['successful_matches'] if item['flat_ref'] == flat_ref)
+                    files_count = len(self._by_flat_ref.get(flat_ref, []))
+                    processed = files_count > 0
                     
                     flat_ref_data.append({
                         'No.': i,
@@ -602,33 +773,22 @@ class FileProcessor:
                 flat_ref_df.to_excel(writer, sheet_name='All Flat References', index=False)
                 
                 # 8. All Section Files Sheet
-                section_data = []
-                for i, section_file in enumerate(self.detailed_results['all_section_files'], 1):
-                    section_data.append({
-                        'No.': i,
-                        'Filename': section_file['filename'],
-                        'Title': section_file['title'],
-                        'Status': 'USED' if section_file['matched'] else 'UNUSED'
-                    })
-                section_df = pd.DataFrame(section_data)
+                section_df = pd.DataFrame(self.detailed_results['all_section_files'], columns=['filename', 'title', 'matched'])
+                section_df = section_df.rename(columns={'filename': 'Filename', 'title': 'Title'})
+                section_df.insert(0, 'No.', range(1, len(section_df) + 1))
+                section_df['Status'] = section_df.pop('matched').map({True: 'USED', False: 'UNUSED'})
                 section_df.to_excel(writer, sheet_name='All Section Files', index=False)
                 
                 # 9. Processing Summary by Flat Reference
-                by_flat_ref = {}
-                for item in self.detailed_results['successful_matches']:
-                    flat_ref = item['flat_ref']
-                    if flat_ref not in by_flat_ref:
-                        by_flat_ref[flat_ref] = []
-                    by_flat_ref[flat_ref].append(item)
-                
                 summary_by_ref = []
                 for flat_ref in self.detailed_results['all_flat_refs']:
-                    files = by_flat_ref.get(flat_ref, [])
+                    files = self._by_flat_ref.get(flat_ref, [])
                     summary_by_ref.append({
                         'Flat Reference': flat_ref,
                         'Files Copied': len(files),
                         'Status': 'SUCCESS' if files else 'NO MATCH',
-                        'Output Folder': files[0]['destination_folder'] if files else 'N/A'
+                        # Copies finish in any order; the first match is the lowest row
+                        'Output Folder': min(files)[1] if files else 'N/A'
                     })
                 
                 summary_by_ref_df = pd.DataFrame(summary_by_ref)
@@ -662,7 +822,22 @@ class FileProcessor:
 
 def main():
     """Main function to run the file processor"""
-    processor = FileProcessor()
+    parser = argparse.ArgumentParser(description="Organise architect drawings by house/flat type")
+    parser.add_argument('--force', action='store_true',
+                        help="re-copy files even if the processed copy is already up to date")
+    args = parser.parse_args()
+    
+    # Configure logging (here rather than at import, as validate_data imports this module)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('file_processing.log'),
+            logging.StreamHandler()
+        ]
+    )
+    
+    processor = FileProcessor(force=args.force)
     
     try:
         success = processor.process_files()
@@ -9,185 +9,330 @@ Author: GitHub Copilot
 Date: October 2025
 """
 
+import bisect
+import functools
+import glob
+import io
+import os
+import re
+import sys
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 from pathlib import Path
 import logging
 
+# Share the spreadsheet reader with the main processor (calamine when installed,
+# otherwise a read-only openpyxl stream; Arrow-backed strings when available)
+from file_processor import read_excel_columns
+
+# Parsed spreadsheets are cached as Parquet next to the workbook when pyarrow is available
+try:
+    import pyarrow
+    PARQUET_CACHE = True
+except ImportError:
+    PARQUET_CACHE = False
+
+# Same folder layout as FileProcessor
+BASE_PATH = Path(r"C:\Users\IS19\Documents\as_built_extraction")
+SPREADSHEET_PATH = BASE_PATH / "spreadsheet"
+ARCHITECT_PATH = BASE_PATH / "architect"
+# Kept as str: that's what the reader (and its cache key) takes
+ACCOMMODATION_FILE = os.fspath(SPREADSHEET_PATH / "accomodation_schedule.xlsx")
+ARCHITECT_FILE = os.fspath(SPREADSHEET_PATH / "architect_spreadsheet.xlsx")
+
+# Sample rows and example values are only shown at a terminal, or when
+# VALIDATE_VERBOSE is set; redirected runs keep just the checks and summaries
+VERBOSE = sys.stdout.isatty() or bool(os.environ.get("VALIDATE_VERBOSE"))
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def examine_spreadsheets():
-    """Examine the structure and content of both spreadsheets"""
-    base_path = Path(r"C:\Users\IS19\Documents\as_built_extraction")
-    spreadsheet_path = base_path / "spreadsheet"
+
+# One lock per workbook so passes running in parallel wait for a single parse
+_read_locks = defaultdict(threading.Lock)
+_read_locks_guard = threading.Lock()
+
+
+def _read_xlsx(path: str) -> pd.DataFrame:
+    """Read a spreadsheet once and reuse it across the validation passes (don't modify the result)"""
+    with _read_locks_guard:
+        lock = _read_locks[path]
+    with lock:
+        return _load_xlsx(path)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_xlsx(path: str) -> pd.DataFrame:
+    """Parse a spreadsheet (cached per path; use _read_xlsx, which serializes callers)
     
-    # Load accommodation schedule
-    print("=" * 60)
-    print("EXAMINING ACCOMMODATION SCHEDULE")
-    print("=" * 60)
+    With pyarrow installed the parsed sheet is also saved as a Parquet sidecar named after
+    the workbook's modification time and size, so later runs skip the xlsx parse until the
+    workbook changes.
+    """
+    if not PARQUET_CACHE:
+        return read_excel_columns(path)
+    
+    workbook = Path(path)
+    stat = workbook.stat()
+    cache = workbook.with_suffix(f".{stat.st_mtime_ns}_{stat.st_size}.parquet")
+    if os.path.exists(cache):
+        try:
+            return pd.read_parquet(cache)
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable spreadsheet cache {cache.name}: {str(e)}")
+    
+    df = read_excel_columns(path)
+    
+    # Drop sidecars left by earlier versions of the workbook (only names this code
+    # writes, <stem>.<mtime_ns>_<size>.parquet, so other Parquet files are left alone)
+    sidecar_name = re.compile(rf"{re.escape(workbook.stem)}\.\d+_\d+\.parquet")
+    for stale in workbook.parent.glob(f"{glob.escape(workbook.stem)}.*.parquet"):
+        if stale != cache and sidecar_name.fullmatch(stale.name):
+            try:
+                stale.unlink()
+            except OSError:
+                pass
     
     try:
-        accommodation_file = spreadsheet_path / "accomodation_schedule.xlsx"
-        df_acc = pd.read_excel(accommodation_file)
-        
-        print(f"Shape: {df_acc.shape}")
-        print(f"Columns: {list(df_acc.columns)}")
-        print("\nFirst 5 rows:")
-        print(df_acc.head())
+        df.to_parquet(cache, compression="zstd")
+    except Exception as e:
+        logging.warning(f"Could not cache {workbook.name} as Parquet: {str(e)}")
+    return df
+
+
+def _safe(label, step, out):
+    """Run one validation step writing to out; a failure is noted in the report and logged with its traceback"""
+    try:
+        step(out)
+    except Exception as e:
+        logging.exception(f"Error {label}")
+        print(f"Error {label}: {e}", file=out)
+
+
+def _examine_accommodation(out):
+    """Report the accommodation schedule's structure and sample values"""
+    df_acc = _read_xlsx(ACCOMMODATION_FILE)
+    
+    print(f"Shape: {df_acc.shape}", file=out)
+    print(f"Columns: {list(df_acc.columns)}", file=out)
+    # Sample rows and column examples are for reading at a terminal
+    if VERBOSE:
+        print("\nFirst 5 rows:", file=out)
+        print(df_acc.head(), file=out)
         
         # Show Column D specifically
-        print(f"\nColumn D (index 3) - 'Flat / House Ref' examples:")
+        print(f"\nColumn D (index 3) - 'Flat / House Ref' examples:", file=out)
         if len(df_acc.columns) > 3:
             col_d_values = df_acc.iloc[:, 3].dropna().head(10)
             for i, value in enumerate(col_d_values):
-                print(f"  {i+1}: {value}")
-        else:
-            print("  Column D not found - check column structure")
-            
-    except Exception as e:
-        print(f"Error loading accommodation schedule: {e}")
+                print(f"  {i+1}: {value}", file=out)
     
-    # Load architect spreadsheet
-    print("\n" + "=" * 60)
-    print("EXAMINING ARCHITECT SPREADSHEET")
-    print("=" * 60)
+    if len(df_acc.columns) <= 3:
+        print("  Column D not found - check column structure", file=out)
+
+
+def _examine_architect(out):
+    """Report the architect spreadsheet's structure and sample values"""
+    df_arch = _read_xlsx(ARCHITECT_FILE)
+    
+    print(f"Shape: {df_arch.shape}", file=out)
+    print(f"Columns: {list(df_arch.columns)}", file=out)
+    # Sample rows and column examples are for reading at a terminal
+    if VERBOSE:
+        print("\nFirst 5 rows:", file=out)
+        print(df_arch.head(), file=out)
     
-    try:
-        architect_file = spreadsheet_path / "architect_spreadsheet.xlsx"
-        df_arch = pd.read_excel(architect_file)
-        
-        print(f"Shape: {df_arch.shape}")
-        print(f"Columns: {list(df_arch.columns)}")
-        print("\nFirst 5 rows:")
-        print(df_arch.head())
-        
         # Show Column A (Filename) and B (Title) specifically
-        print(f"\nColumn A - 'Filename' examples:")
+        print(f"\nColumn A - 'Filename' examples:", file=out)
         if len(df_arch.columns) > 0:
             col_a_values = df_arch.iloc[:, 0].dropna().head(10)
             for i, value in enumerate(col_a_values):
-                print(f"  {i+1}: {value}")
-        
-        print(f"\nColumn B - 'Title' examples:")
+                print(f"  {i+1}: {value}", file=out)
+    
+        print(f"\nColumn B - 'Title' examples:", file=out)
         if len(df_arch.columns) > 1:
             col_b_values = df_arch.iloc[:, 1].dropna().head(10)
             for i, value in enumerate(col_b_values):
-                print(f"  {i+1}: {value}")
-                
+                print(f"  {i+1}: {value}", file=out)
+            
         # Look for "Sections" entries specifically
-        print(f"\nEntries containing 'Sections':")
+        print(f"\nEntries containing 'Sections':", file=out)
         if len(df_arch.columns) > 1:
             sections_mask = df_arch.iloc[:, 1].str.contains("Sections", case=False, na=False)
             sections_entries = df_arch[sections_mask].head(10)
-            for idx, row in sections_entries.iterrows():
-                filename = row.iloc[0] if pd.notna(row.iloc[0]) else "N/A"
-                title = row.iloc[1] if pd.notna(row.iloc[1]) else "N/A"
-                print(f"  {filename} -> {title}")
-                
-    except Exception as e:
-        print(f"Error loading architect spreadsheet: {e}")
+            # Walk the two columns as arrays (missing values already "N/A") instead of iterrows()
+            entry_filenames = sections_entries.iloc[:, 0].to_numpy(dtype=object, na_value="N/A")
+            entry_titles = sections_entries.iloc[:, 1].to_numpy(dtype=object, na_value="N/A")
+            for filename, title in zip(entry_filenames, entry_titles):
+                print(f"  {filename} -> {title}", file=out)
 
 
-def test_matching_logic():
-    """Test the matching logic with sample data"""
-    print("\n" + "=" * 60)
-    print("TESTING MATCHING LOGIC")
-    print("=" * 60)
+def examine_spreadsheets():
+    """Examine the structure and content of both spreadsheets (returns the report text)"""
+    out = io.StringIO()
+    
+    # Load accommodation schedule
+    print("=" * 60, file=out)
+    print("EXAMINING ACCOMMODATION SCHEDULE", file=out)
+    print("=" * 60, file=out)
+    _safe("loading accommodation schedule", _examine_accommodation, out)
     
-    base_path = Path(r"C:\Users\IS19\Documents\as_built_extraction")
-    spreadsheet_path = base_path / "spreadsheet"
+    # Load architect spreadsheet
+    print("\n" + "=" * 60, file=out)
+    print("EXAMINING ARCHITECT SPREADSHEET", file=out)
+    print("=" * 60, file=out)
+    _safe("loading architect spreadsheet", _examine_architect, out)
     
-    try:
-        # Load both files
-        accommodation_file = spreadsheet_path / "accomodation_schedule.xlsx"
-        architect_file = spreadsheet_path / "architect_spreadsheet.xlsx"
+    return out.getvalue()
+
+
+def _test_matching(out):
+    """Match the first few flat refs against the section titles"""
+    # Load both files
+    df_acc = _read_xlsx(ACCOMMODATION_FILE)
+    df_arch = _read_xlsx(ARCHITECT_FILE)
+    
+    # Get flat references (Column D)
+    if len(df_acc.columns) > 3:
+        # Refs repeat across plots, so hold the column as categorical codes; unique()
+        # keeps first-appearance order (cat.categories would be sorted)
+        col_d = df_acc.iloc[:, 3].dropna().astype("category")
+        flat_refs = col_d.unique()[:5].tolist()  # Test with first 5
+        print(f"Testing with flat references: {list(flat_refs)}", file=out)
+    else:
+        print("Cannot access Column D in accommodation schedule", file=out)
+        return
+    
+    # Test matching
+    if len(df_arch.columns) > 1:
+        titles = df_arch.iloc[:, 1]  # Column B
+        filenames = df_arch.iloc[:, 0]  # Column A
         
-        df_acc = pd.read_excel(accommodation_file)
-        df_arch = pd.read_excel(architect_file)
+        # Index the text following every "Sections - " in the titles, sorted, so
+        # each ref is a binary search for the entries that start with it
+        marker = "sections - "
+        section_index = []
+        for row, title in enumerate(titles.to_numpy(dtype=object, na_value="")):
+            lowered = title.lower()
+            start = lowered.find(marker)
+            while start != -1:
+                section_index.append((lowered[start + len(marker):], row))
+                start = lowered.find(marker, start + 1)
+        section_index.sort()
+        suffixes = [suffix for suffix, _ in section_index]
         
-        # Get flat references (Column D)
-        if len(df_acc.columns) > 3:
-            flat_refs = df_acc.iloc[:, 3].dropna().unique()[:5]  # Test with first 5
-            print(f"Testing with flat references: {list(flat_refs)}")
-        else:
-            print("Cannot access Column D in accommodation schedule")
-            return
+        # Exact matches for every ref first, so the partial search below can
+        # cover all the refs that missed in a single pass over the titles
+        matches_by_ref = {}
+        for flat_ref in flat_refs:
+            key = flat_ref.lower()
+            matching_rows = set()
+            i = bisect.bisect_left(suffixes, key)
+            while i < len(suffixes) and suffixes[i].startswith(key):
+                matching_rows.add(section_index[i][1])
+                i += 1
+            matches_by_ref[flat_ref] = sorted(matching_rows)
         
-        # Test matching
-        if len(df_arch.columns) > 1:
-            titles = df_arch.iloc[:, 1]  # Column B
-            filenames = df_arch.iloc[:, 0]  # Column A
+        # Titles containing any missed ref as literal text; each missed ref is
+        # then only checked against these
+        missed_refs = [ref for ref in flat_refs if not matches_by_ref[ref]]
+        candidate_rows = np.array([], dtype=int)
+        if missed_refs:
+            # A string pattern with case=False (pandas < 3 rejects compiled patterns on Arrow strings)
+            any_missed = "|".join(re.escape(ref) for ref in missed_refs)
+            candidate_rows = np.flatnonzero(titles.str.contains(any_missed, case=False, na=False).to_numpy(dtype=bool))
+        candidate_titles = titles.iloc[candidate_rows]
+        
+        for flat_ref in flat_refs:
+            print(f"\nLooking for matches with: '{flat_ref}'", file=out)
+            target_pattern = f"Sections - {flat_ref}"
+            print(f"  Target pattern: '{target_pattern}'", file=out)
             
-            for flat_ref in flat_refs:
-                print(f"\nLooking for matches with: '{flat_ref}'")
-                target_pattern = f"Sections - {flat_ref}"
-                print(f"  Target pattern: '{target_pattern}'")
+            matching_rows = matches_by_ref[flat_ref]
+            if matching_rows:
+                print(f"  ✓ Found {len(matching_rows)} match(es):", file=out)
+                for idx in matching_rows:
+                    filename = filenames.iat[idx]
+                    title = titles.iat[idx]
+                    print(f"    - {filename} -> {title}", file=out)
+            else:
+                print(f"  ✗ No matches found", file=out)
                 
-                # Find matches
-                matching_rows = titles.str.contains(target_pattern, case=False, na=False)
-                
-                if matching_rows.any():
-                    print(f"  ✓ Found {matching_rows.sum()} match(es):")
-                    for idx in matching_rows[matching_rows].index:
-                        filename = filenames.iloc[idx]
-                        title = titles.iloc[idx]
-                        print(f"    - {filename} -> {title}")
-                else:
-                    print(f"  ✗ No matches found")
-                    
-                    # Try to find partial matches for debugging
-                    partial_matches = titles.str.contains(flat_ref, case=False, na=False)
-                    if partial_matches.any():
-                        print(f"    But found partial matches:")
-                        for idx in partial_matches[partial_matches].index[:3]:  # Show first 3
-                            title = titles.iloc[idx]
-                            print(f"      - {title}")
-        
-    except Exception as e:
-        print(f"Error in matching logic test: {e}")
+                # Try to find partial matches for debugging
+                partial_matches = candidate_titles.str.contains(flat_ref, case=False, regex=False)
+                partial_hits = candidate_rows[partial_matches.to_numpy(dtype=bool)]
+                if len(partial_hits):
+                    print(f"    But found partial matches:", file=out)
+                    for idx in partial_hits[:3]:  # Show first 3
+                        title = titles.iat[idx]
+                        print(f"      - {title}", file=out)
 
 
-def check_file_availability():
-    """Check if files mentioned in architect spreadsheet actually exist"""
-    print("\n" + "=" * 60)
-    print("CHECKING FILE AVAILABILITY")
-    print("=" * 60)
-    
-    base_path = Path(r"C:\Users\IS19\Documents\as_built_extraction")
-    spreadsheet_path = base_path / "spreadsheet"
-    architect_path = base_path / "architect"
+def test_matching_logic():
+    """Test the matching logic with sample data (returns the report text)"""
+    out = io.StringIO()
+    print("\n" + "=" * 60, file=out)
+    print("TESTING MATCHING LOGIC", file=out)
+    print("=" * 60, file=out)
+    _safe("in matching logic test", _test_matching, out)
+    return out.getvalue()
+
+
+def _check_files(out):
+    """Look up every architect filename in the architect folder"""
+    df_arch = _read_xlsx(ARCHITECT_FILE)
     
-    try:
-        architect_file = spreadsheet_path / "architect_spreadsheet.xlsx"
-        df_arch = pd.read_excel(architect_file)
+    if len(df_arch.columns) > 0:
+        # unique() on the Arrow-backed column runs pyarrow's hash kernel; tolist()
+        # hands back plain str objects for the set lookups below
+        filenames = df_arch.iloc[:, 0].dropna().unique().tolist()
         
-        if len(df_arch.columns) > 0:
-            filenames = df_arch.iloc[:, 0].dropna().unique()
-            
-            print(f"Checking {len(filenames)} unique filenames...")
-            
-            found_count = 0
-            missing_count = 0
-            
-            for filename in filenames[:20]:  # Check first 20 files
-                file_path = architect_path / filename
-                if file_path.exists():
-                    found_count += 1
-                    print(f"  ✓ Found: {filename}")
-                else:
-                    missing_count += 1
-                    print(f"  ✗ Missing: {filename}")
-            
-            print(f"\nSummary (first 20 files):")
-            print(f"  Found: {found_count}")
-            print(f"  Missing: {missing_count}")
-            
-            if missing_count > 0:
-                print(f"\nNote: Some files may have different naming conventions.")
-                print(f"You may need to adjust the matching logic.")
+        print(f"Checking {len(filenames)} unique filenames...", file=out)
         
-    except Exception as e:
-        print(f"Error checking file availability: {e}")
+        # List the architect folder once instead of a stat per filename
+        try:
+            existing = {os.path.normcase(entry.name) for entry in os.scandir(ARCHITECT_PATH)}
+        except OSError as e:
+            print(f"Could not list architect folder: {e}", file=out)
+            existing = set()
+        
+        # A miss is confirmed with a stat, as FileProcessor.copy_file does: names with a
+        # folder part (e.g. "sub/A-100.pdf") aren't in the flat listing, and case-insensitive
+        # filesystems other than Windows find names that differ only in case
+        missing = set()
+        for filename in filenames:
+            present = os.path.basename(filename) == filename and os.path.normcase(filename) in existing
+            if not present and not os.path.exists(os.path.join(ARCHITECT_PATH, filename)):
+                missing.add(filename)
+        missing_count = len(missing)
+        found_count = len(filenames) - missing_count
+        
+        for filename in filenames:
+            if filename in missing:
+                print(f"  ✗ Missing: {filename}", file=out)
+            else:
+                print(f"  ✓ Found: {filename}", file=out)
+        
+        print(f"\nSummary:", file=out)
+        print(f"  Found: {found_count}", file=out)
+        print(f"  Missing: {missing_count}", file=out)
+        
+        if missing_count > 0:
+            print(f"\nNote: Some files may have different naming conventions.", file=out)
+            print(f"You may need to adjust the matching logic.", file=out)
+
+
+def check_file_availability():
+    """Check if files mentioned in architect spreadsheet actually exist (returns the report text)"""
+    out = io.StringIO()
+    print("\n" + "=" * 60, file=out)
+    print("CHECKING FILE AVAILABILITY", file=out)
+    print("=" * 60, file=out)
+    _safe("checking file availability", _check_files, out)
+    return out.getvalue()
 
 
 def main():
@@ -195,9 +340,15 @@ def main():
     print("FILE PROCESSING VALIDATION SCRIPT")
     print("This script will help you understand your data before processing")
     
-    examine_spreadsheets()
-    test_matching_logic()
-    check_file_availability()
+    # The passes are independent, so run them side by side (the two workbook
+    # parses and the directory listing overlap) and print each report in order
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        reports = [executor.submit(examine_spreadsheets),
+                   executor.submit(test_matching_logic),
+                   executor.submit(check_file_availability)]
+        for report in reports:
+            # Emit each whole section with one write rather than a console call per line
+            sys.stdout.write(report.result())
     
     print(f"\n" + "=" * 60)
     print("VALIDATION COMPLETE")